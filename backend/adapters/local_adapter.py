@@ -1,41 +1,200 @@
 # backend/adapters/local_adapter.py
+import asyncio
+import contextlib
+import functools
+import json
 import os
-import shutil
-import subprocess
 import tempfile
+import threading
 import uuid
 from pathlib import Path
-from typing import Optional
+from typing import List, Optional
+
+from ..utils import audio as audio_utils
+from ..utils.audio import pcm_to_wav_bytes
+from ..utils.fileio import fast_copy
 
 VOICE_STORE_DIR = Path("backend/storage/voices")  # update to your repo's voice folder
 TTS_MODEL_NAME = "tts_models/multilingual/multi-dataset/xtts_v2"  # change if you prefer another model
+# "auto": fp16 autocast on CUDA, int8 dynamic quantization of the GPT decoder on CPU; "fp32": neither
+TTS_PRECISION = os.getenv("LOCAL_TTS_PRECISION", "auto")
 
 VOICE_STORE_DIR.mkdir(parents=True, exist_ok=True)
 
+# containers libsndfile can't decode; these always go through ffmpeg
+FFMPEG_ONLY_SUFFIXES = {".m4a", ".mp4", ".aac", ".opus", ".webm", ".wma"}
+
+# XTTS forward is not reentrant; serialize calls into the shared model
+_TTS_LOCK = threading.Lock()
+
+
+@functools.lru_cache(maxsize=1)
+def _get_tts(model_name: str = TTS_MODEL_NAME):
+    """
+    Load the Coqui TTS model once per process and keep it warm between requests.
+    Imported lazily so the backend still starts without `TTS`/`torch` installed.
+    """
+    import torch
+    from TTS.api import TTS
+
+    use_gpu = torch.cuda.is_available()
+    tts = TTS(model_name, gpu=use_gpu)
+    if use_gpu:
+        torch.backends.cudnn.benchmark = True
+        if TTS_PRECISION != "fp32":
+            # the vocoder's output is .numpy()'d by XTTS; keep it in fp32
+            _run_in_fp32(getattr(tts.synthesizer.tts_model, "hifigan_decoder", None))
+        # No CUDA Graph capture of the GPT decode step: XTTS decodes through HF generate()
+        # with a KV cache that grows every token, so there is no fixed-shape step to replay.
+    elif TTS_PRECISION != "fp32":
+        # the autoregressive decoder is the bandwidth-bound hot path. Its GPT-2 blocks use HF
+        # Conv1D (not nn.Linear), so convert those first or quantize_dynamic would skip them.
+        model = tts.synthesizer.tts_model
+        target = getattr(model, "gpt", model)
+        _conv1d_to_linear(target)
+        torch.quantization.quantize_dynamic(target, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+    return tts
+
+
+def _conv1d_to_linear(module) -> None:
+    """
+    Replace Hugging Face `Conv1D` layers (GPT-2's c_attn / c_proj / c_fc) in-place with
+    equivalent `nn.Linear` ones. Conv1D stores its weight as (in, out), Linear as (out, in).
+    """
+    import torch
+
+    try:
+        from transformers.pytorch_utils import Conv1D
+    except ImportError:
+        return
+
+    for name, child in module.named_children():
+        if isinstance(child, Conv1D):
+            in_features, out_features = child.weight.shape
+            linear = torch.nn.Linear(in_features, out_features, bias=child.bias is not None,
+                                     device=child.weight.device, dtype=child.weight.dtype)
+            with torch.no_grad():
+                linear.weight.copy_(child.weight.t())
+                if child.bias is not None:
+                    linear.bias.copy_(child.bias)
+            setattr(module, name, linear)
+        else:
+            _conv1d_to_linear(child)
+
+
+def _run_in_fp32(module, device_type: str = "cuda") -> None:
+    """
+    Exclude `module` from autocast: its forward runs with autocast disabled on fp32
+    inputs, so its outputs are fp32 even when called inside _inference_context().
+    """
+    if module is None:
+        return
+    import torch
+
+    forward = module.forward
+
+    def to_fp32(x):
+        return x.float() if torch.is_tensor(x) and x.is_floating_point() else x
+
+    @functools.wraps(forward)
+    def fp32_forward(*args, **kwargs):
+        with torch.autocast(device_type, enabled=False):
+            return forward(*map(to_fp32, args), **{k: to_fp32(v) for k, v in kwargs.items()})
+
+    module.forward = fp32_forward
+
+
+@contextlib.contextmanager
+def _inference_context():
+    """
+    No-grad inference, under fp16 autocast on CUDA. Autocast ops return fp16, which
+    numpy can represent (unlike bf16) when XTTS .numpy()'s its GPT latents; the
+    HiFiGAN vocoder is kept out of autocast by _run_in_fp32, so the audio stays fp32.
+    """
+    import torch
+
+    with torch.inference_mode():
+        if TTS_PRECISION != "fp32" and torch.cuda.is_available():
+            with torch.autocast("cuda", dtype=torch.float16):
+                yield
+        else:
+            yield
+
 
 class LocalAdapter:
     """
-    Local adapter that uses Coqui TTS CLI (python package `TTS`) to synthesize
-    speech using a reference audio (speaker_wav / reference).
+    Local adapter that uses Coqui TTS (python package `TTS`, loaded in-process) to
+    synthesize speech using a reference audio (speaker_wav / reference).
     """
 
     def __init__(self, voice_dir: Path = VOICE_STORE_DIR, model_name: str = TTS_MODEL_NAME):
         self.voice_dir = Path(voice_dir)
         self.model_name = model_name
+        # one lock per normalized file so concurrent first-time requests don't race on the same output
+        self._norm_locks: dict[str, asyncio.Lock] = {}
 
-    def _normalize_reference(self, src_path: Path) -> Path:
+    def _norm_lock(self, key: str) -> asyncio.Lock:
+        return self._norm_locks.setdefault(key, asyncio.Lock())
+
+    async def _normalize_reference(self, key: str, src_path: Path, needs_normalization: Optional[bool] = None) -> Path:
         """
-        Ensure reference is WAV, mono, 22050Hz (or 16000 if you pick),
-        writes a normalized copy and returns its path.
+        Ensure reference is WAV, mono, 22050Hz (or 16000 if you pick).
+        References already in that format are returned unchanged. Otherwise the normalized
+        copy is written once per `key` (a voice id, or the sample's sha256 so voices sharing a
+        sample share one copy) as `{key}.norm.wav` and reused until the source file's
+        mtime/size change (tracked in a `{key}.norm.json` sidecar).
+        Pass `needs_normalization` (as stored in voice meta) to skip probing the file.
         """
         src = Path(src_path)
         if not src.exists():
             raise FileNotFoundError(f"Reference audio not found: {src}")
 
-        normalized = self.voice_dir / f"{src.stem}_normalized_{uuid.uuid4().hex}.wav"
-        # Use ffmpeg to resample/convert to WAV 22050 mono
-        cmd = [
-            "ffmpeg",
+        if needs_normalization is None:
+            needs_normalization = audio_utils.needs_normalization(src)
+        if not needs_normalization:
+            return src
+
+        normalized = self.voice_dir / f"{key}.norm.wav"
+        sidecar = self.voice_dir / f"{key}.norm.json"
+
+        async with self._norm_lock(key):
+            st = src.stat()
+            stamp = {"src_mtime": st.st_mtime, "src_size": st.st_size}
+            if normalized.exists() and sidecar.exists():
+                try:
+                    with open(sidecar, "r") as f:
+                        if json.load(f) == stamp:
+                            return normalized
+                except (OSError, ValueError):
+                    pass  # unreadable sidecar -> regenerate
+
+            await self._convert_reference(src, normalized)
+            with open(sidecar, "w") as f:
+                json.dump(stamp, f)
+            return normalized
+
+    async def _convert_reference(self, src: Path, normalized: Path) -> None:
+        """
+        Decode + resample in-process with soundfile/soxr when available (no fork/exec),
+        falling back to ffmpeg for containers libsndfile can't read.
+        """
+        if audio_utils.soundfile is not None and src.suffix.lower() not in FFMPEG_ONLY_SUFFIXES:
+            tmp = normalized.with_name(f"{normalized.stem}.{uuid.uuid4().hex}.tmp.wav")
+            try:
+                await asyncio.to_thread(audio_utils.resample_mono, src, tmp, 22050)
+                os.replace(tmp, normalized)
+                return
+            except RuntimeError:
+                pass  # libsndfile couldn't decode it; let ffmpeg try
+            finally:
+                tmp.unlink(missing_ok=True)
+        await self._run_ffmpeg_normalize(src, normalized)
+
+    async def _run_ffmpeg_normalize(self, src: Path, normalized: Path) -> None:
+        # write to a temp name and rename so readers never see a half-written file
+        tmp = normalized.with_name(f"{normalized.stem}.{uuid.uuid4().hex}.tmp.wav")
+        # Use ffmpeg to resample/convert to WAV 22050 mono, without blocking the event loop
+        args = [
             "-y",
             "-i",
             str(src),
@@ -45,10 +204,62 @@ class LocalAdapter:
             "22050",
             "-f",
             "wav",
-            str(normalized),
+            str(tmp),
         ]
-        subprocess.run(cmd, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-        return normalized
+        try:
+            proc = await asyncio.create_subprocess_exec(
+                "ffmpeg", *args, stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.PIPE
+            )
+            _, stderr = await proc.communicate()
+            if proc.returncode != 0:
+                raise RuntimeError(f"ffmpeg failed (rc={proc.returncode}): {stderr.decode(errors='replace')}")
+            os.replace(tmp, normalized)
+        finally:
+            tmp.unlink(missing_ok=True)
+
+    async def reference_for(self, key: str, src_path: str, needs_normalization: Optional[bool] = None) -> Path:
+        """
+        Return a TTS-ready reference path for a sample stored elsewhere (e.g. VoiceStore).
+        `key` names the normalized copy; pass the sample's sha256 so deduplicated voices
+        reuse one normalized file.
+        """
+        return await self._normalize_reference(key, Path(src_path), needs_normalization)
+
+    def synthesize_batch(self, texts: List[str], speaker_wav: str) -> List[bytes]:
+        """
+        Synthesize several texts for one reference under a single model lock.
+        For XTTS the speaker conditioning is computed once and shared by the whole group.
+        Returns one WAV payload per input text.
+        """
+        tts = _get_tts(self.model_name)
+        model = tts.synthesizer.tts_model
+        with _TTS_LOCK, _inference_context():
+            if hasattr(model, "get_conditioning_latents"):
+                # same settings XTTS.synthesize() (i.e. tts.tts()) takes from the model config
+                config = tts.synthesizer.tts_config
+                gpt_cond_latent, speaker_embedding = model.get_conditioning_latents(
+                    audio_path=[speaker_wav],
+                    gpt_cond_len=config.gpt_cond_len,
+                    gpt_cond_chunk_len=config.gpt_cond_chunk_len,
+                    max_ref_length=config.max_ref_len,
+                    sound_norm_refs=config.sound_norm_refs,
+                )
+                wavs = [
+                    model.inference(
+                        t, "en", gpt_cond_latent, speaker_embedding,
+                        temperature=config.temperature,
+                        length_penalty=config.length_penalty,
+                        repetition_penalty=config.repetition_penalty,
+                        top_k=config.top_k,
+                        top_p=config.top_p,
+                        enable_text_splitting=True,  # long texts would overflow the GPT's token limit
+                    )["wav"]
+                    for t in texts
+                ]
+            else:
+                wavs = [tts.tts(text=t, speaker_wav=speaker_wav, language="en") for t in texts]
+        sr = tts.synthesizer.output_sample_rate
+        return [pcm_to_wav_bytes(w, sr) for w in wavs]
 
     def create_voice(self, reference_audio_path: str, name: Optional[str] = None) -> dict:
         """
@@ -62,13 +273,14 @@ class LocalAdapter:
         voice_id = uuid.uuid4().hex
         filename = f"{voice_id}_{src.name}"
         dst = self.voice_dir / filename
-        shutil.copy2(src, dst)
+        fast_copy(src, dst)
 
         meta = {
             "voice_id": voice_id,
             "name": name or f"local-{voice_id[:8]}",
             "filename": filename,
             "path": str(dst),
+            "needs_normalization": audio_utils.needs_normalization(dst),
         }
         # Persist however your repo expects (file, DB). Example: write a json, or call VoiceStore.
         # For demo, we write a small meta json file alongside the wav:
@@ -85,51 +297,29 @@ class LocalAdapter:
         with open(meta_path, "r") as f:
             return json.load(f)
 
-    def speak_using_reference(self, voice_id: str, text: str, out_format: str = "wav") -> bytes:
-        """
-        Synthesize speech for `text` using the stored reference for `voice_id`.
-        Returns raw audio bytes (WAV by default).
-        """
-        meta = self._load_voice_meta(voice_id)
-        ref_path = Path(meta["path"])
-        # normalize reference to expected sample rate & channels
-        normalized_ref = self._normalize_reference(ref_path)
+    def _synthesize_to_bytes(self, text: str, speaker_wav: Path, out_format: str) -> bytes:
+        tts = _get_tts(self.model_name)
 
         # produce temp output file
         with tempfile.TemporaryDirectory() as td:
             out_path = Path(td) / f"out.{out_format}"
-            # Build CLI command for coqui TTS
-            # Note: CLI option names vary by coqui TTS version: `--speaker_wav` or `--speaker_wav_path`.
-            # The widely supported option is `--speaker_wav` (used in many examples).
-            cmd = [
-                "tts",
-                "--text",
-                text,
-                "--model_name",
-                self.model_name,
-                "--out_path",
-                str(out_path),
-                "--speaker_wav",
-                str(normalized_ref),
-            ]
-
-            # If the selected model requires language or speaker index, add args here.
-            # Example:
-            # cmd += ["--language", "en"]
-
-            proc = subprocess.run(cmd, capture_output=True)
-            if proc.returncode != 0 or not out_path.exists():
-                raise RuntimeError(
-                    f"Coqui TTS failed (rc={proc.returncode}). stdout: {proc.stdout.decode()}\nstderr: {proc.stderr.decode()}"
-                )
+            with _TTS_LOCK, _inference_context():
+                tts.tts_to_file(text=text, speaker_wav=str(speaker_wav), language="en", file_path=str(out_path))
+            if not out_path.exists():
+                raise RuntimeError("Coqui TTS produced no output")
 
             # Read bytes and return
-            audio_bytes = out_path.read_bytes()
+            return out_path.read_bytes()
 
-        # cleanup normalized ref
-        try:
-            normalized_ref.unlink()
-        except Exception:
-            pass
+    async def speak_using_reference(self, voice_id: str, text: str, out_format: str = "wav") -> bytes:
+        """
+        Synthesize speech for `text` using the stored reference for `voice_id`.
+        Returns raw audio bytes (WAV by default).
+        """
+        meta = self._load_voice_meta(voice_id)
+        ref_path = Path(meta["path"])
+        # normalize reference to expected sample rate & channels
+        normalized_ref = await self._normalize_reference(voice_id, ref_path, meta.get("needs_normalization"))
 
-        return audio_bytes
+        # model inference is blocking; keep it off the event loop
+        return await asyncio.to_thread(self._synthesize_to_bytes, text, normalized_ref, out_format)
@@ -1,16 +1,33 @@
 # backend/app.py
 import os
+import re
+import json
+import asyncio
 import base64
+import hashlib
 import uuid
 from pathlib import Path
-from fastapi import FastAPI, UploadFile, File, Form, HTTPException
-from fastapi.responses import JSONResponse, FileResponse
+from typing import Literal
+from urllib.parse import quote
+import anyio
+from fastapi import FastAPI, Request, UploadFile, File, Form, HTTPException
+from fastapi.responses import JSONResponse, FileResponse, Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict
 from .voice_store import VoiceStore
-from .tts_adapters import OpenAIAdapter, LocalAdapter
+from .audio_cache import AudioCache
+from .tts_adapters import OpenAIAdapter
+from .adapters.local_adapter import LocalAdapter
+from .batching import SpeakBatcher
+from .utils.audio import read_wav, wav_stream_header, apply_edge_fade
 from dotenv import load_dotenv
 
+# Optional dependency
+try:
+    import pysbd
+except Exception:
+    pysbd = None
+
 load_dotenv()
 
 STORAGE_DIR = Path(os.getenv("VOICE_STORAGE_DIR", "voice_storage"))
@@ -24,13 +41,29 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Transcription", "X-Response-Text", "X-Cache"],
 )
 
-voice_store = VoiceStore(STORAGE_DIR)
+voice_store = VoiceStore(STORAGE_DIR, keep_original=os.getenv("KEEP_ORIGINAL_UPLOADS", "").lower() in ("1", "true", "yes"))
+# synthesized audio keyed by (text, voice_id, provider, format); trimmed to size on startup
+audio_cache = AudioCache(STORAGE_DIR / "cache", max_bytes=int(os.getenv("AUDIO_CACHE_MAX_MB", "512")) << 20)
+audio_cache.evict()
 
 # Choose adapters here. We initialize both; choose per-request via `provider` param.
 openai_adapter = OpenAIAdapter(api_key=os.getenv("OPENAI_API_KEY"))
-local_adapter = LocalAdapter()  # requires you to implement / configure
+LOCAL_REF_DIR = STORAGE_DIR / "local"  # normalized references for the local TTS model
+LOCAL_REF_DIR.mkdir(parents=True, exist_ok=True)
+local_adapter = LocalAdapter(voice_dir=LOCAL_REF_DIR)
+# concurrent local /speak calls are coalesced into per-voice micro-batches
+speak_batcher = SpeakBatcher(local_adapter.synthesize_batch)
+
+# Bound in-flight OpenAI calls so load spikes don't exhaust the threadpool or hit provider rate limits
+_openai_sem = asyncio.Semaphore(int(os.getenv("OPENAI_CONCURRENCY", "3")))
+
+async def _run(fn, *args, **kwargs):
+    """Run a blocking provider call in a worker thread, at most OPENAI_CONCURRENCY at a time."""
+    async with _openai_sem:
+        return await anyio.to_thread.run_sync(lambda: fn(*args, **kwargs))
 
 class CreateVoiceResponse(BaseModel):
     voice_id: str
@@ -38,6 +71,22 @@ class CreateVoiceResponse(BaseModel):
     filename: str
     download_url: str
 
+class VoiceMetadata(BaseModel):
+    model_config = ConfigDict(extra="allow")  # pass through any other keys stored in the meta JSON
+
+    id: str
+    name: str
+    filename: str
+    path: str
+    sha256: str | None = None
+
+class TranscribeResponse(BaseModel):
+    text: str | None
+
+class SpeakJSONResponse(BaseModel):
+    audio_base64: str
+    format: str
+
 @app.post("/voices", response_model=CreateVoiceResponse)
 async def create_voice(file: UploadFile = File(...), name: str = Form(None)):
     """
@@ -47,38 +96,61 @@ async def create_voice(file: UploadFile = File(...), name: str = Form(None)):
     if not file.content_type.startswith("audio/"):
         raise HTTPException(status_code=400, detail="Upload must be an audio file")
 
-    contents = await file.read()
-    voice_id = voice_store.create_voice(contents, original_filename=file.filename, name=name)
+    # transcoding the sample is CPU work; keep it off the event loop
+    voice_id = await anyio.to_thread.run_sync(
+        lambda: voice_store.create_voice(file.file, original_filename=file.filename, name=name)
+    )
     download_url = f"/voices/{voice_id}/download"
     return CreateVoiceResponse(voice_id=voice_id, name=voice_store.get(voice_id)["name"],
                               filename=voice_store.get(voice_id)["filename"],
                               download_url=download_url)
 
-@app.get("/voices/{voice_id}")
-async def get_voice_metadata(voice_id: str):
+def etag_matches(request: Request, etag: str) -> bool:
+    """True when the client's If-None-Match already covers `etag` (weak comparison)."""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    return etag.removeprefix("W/") in {t.strip().removeprefix("W/") for t in header.split(",")}
+
+@app.get("/voices/{voice_id}", response_model=VoiceMetadata)
+async def get_voice_metadata(voice_id: str, request: Request, response: Response):
     v = voice_store.get(voice_id)
     if not v:
         raise HTTPException(status_code=404, detail="voice not found")
+    # metadata can change (e.g. name), so clients revalidate every time
+    etag = '"%s"' % hashlib.sha256(json.dumps(v, sort_keys=True).encode("utf-8")).hexdigest()
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
     return v
 
 @app.get("/voices/{voice_id}/download")
-async def download_voice_file(voice_id: str):
+async def download_voice_file(voice_id: str, request: Request):
     v = voice_store.get(voice_id)
     if not v:
         raise HTTPException(status_code=404, detail="voice not found")
-    return FileResponse(v["path"], media_type="application/octet-stream", filename=v["filename"])
+    headers = {}
+    if v.get("sha256"):  # voices created before hashes were recorded go without
+        # a voice's sample never changes after upload
+        headers = {"ETag": f'"{v["sha256"]}"', "Cache-Control": "public, max-age=31536000, immutable"}
+        if etag_matches(request, headers["ETag"]):
+            return Response(status_code=304, headers=headers)
+    return FileResponse(v["path"], media_type="application/octet-stream", filename=v["filename"], headers=headers)
 
-@app.post("/transcribe")
+@app.post("/transcribe", response_model=TranscribeResponse)
 async def transcribe_audio(file: UploadFile = File(...), provider: str = Form("openai")):
     """
     Transcribe an uploaded audio file. Uses provider specified (currently supports 'openai').
     """
-    contents = await file.read()
     if provider == "openai":
         if not openai_adapter.is_configured:
             raise HTTPException(status_code=500, detail="OpenAI adapter not configured (set OPENAI_API_KEY)")
-        text = openai_adapter.transcribe_audio_bytes(contents, filename=file.filename)
-        return {"text": text}
+        text = await _run(openai_adapter.transcribe_audio_stream, file.file,
+                          filename=file.filename, content_type=file.content_type)
+        return TranscribeResponse(text=text)
     else:
         raise HTTPException(status_code=400, detail="Unknown provider")
 
@@ -86,14 +158,11 @@ class SpeakRequest(BaseModel):
     text: str
     voice_id: str
     provider: str | None = "openai"   # which TTS provider to use
-    format: str | None = "wav"        # wav or mp3
+    format: Literal["wav", "mp3"] = "wav"
 
-@app.post("/speak")
-async def speak(req: SpeakRequest):
-    """
-    Synthesize text using the voice referred by voice_id.
-    Returns base64-encoded WAV bytes (so you can easily play it client-side).
-    """
+AUDIO_MEDIA_TYPES = {"wav": "audio/wav", "mp3": "audio/mpeg"}
+
+async def synthesize(req: SpeakRequest) -> bytes:
     v = voice_store.get(req.voice_id)
     if not v:
         raise HTTPException(status_code=404, detail="voice not found")
@@ -101,27 +170,101 @@ async def speak(req: SpeakRequest):
     if req.provider == "openai":
         if not openai_adapter.is_configured:
             raise HTTPException(status_code=500, detail="OpenAI adapter not configured (set OPENAI_API_KEY)")
-        audio_bytes = openai_adapter.speak_using_reference(text=req.text, reference_audio_path=v["path"], out_format=req.format)
+        return await _run(openai_adapter.speak_using_reference, text=req.text, reference_audio_path=v["path"], out_format=req.format)
     elif req.provider == "local":
-        audio_bytes = local_adapter.speak_using_reference(text=req.text, reference_audio_path=v["path"], out_format=req.format)
+        if req.format != "wav":
+            # the local model path only produces WAV (see LocalAdapter.synthesize_batch)
+            raise HTTPException(status_code=400, detail="local provider only supports format 'wav'")
+        # deduplicated voices share a stored sample, so key the normalized copy by its hash
+        ref_key = v.get("sha256") or req.voice_id
+        voice_ref = await local_adapter.reference_for(ref_key, v["path"], v.get("needs_normalization"))
+        return await speak_batcher.submit(req.text, str(voice_ref))
     else:
         raise HTTPException(status_code=400, detail="Unknown provider")
 
-    payload_b64 = base64.b64encode(audio_bytes).decode("utf-8")
-    return {"audio_base64": payload_b64, "format": req.format}
+async def synthesize_and_store(req: SpeakRequest, key: str) -> bytes:
+    audio_bytes = await synthesize(req)
+    audio_cache.put(key, req.format, audio_bytes)
+    return audio_bytes
+
+def cache_key(req: SpeakRequest) -> str:
+    return AudioCache.key(req.text, req.voice_id, req.provider or "", req.format)
+
+@app.post("/speak")
+async def speak(req: SpeakRequest):
+    """
+    Synthesize text using the voice referred by voice_id.
+    Returns the raw audio as the response body (audio/wav or audio/mpeg).
+    """
+    key = cache_key(req)
+    audio_bytes = audio_cache.get(key, req.format)
+    hit = audio_bytes is not None
+    if not hit:
+        audio_bytes = await synthesize_and_store(req, key)
+    return Response(content=audio_bytes, media_type=AUDIO_MEDIA_TYPES[req.format],
+                    headers={"X-Cache": "HIT" if hit else "MISS"})
+
+@app.post("/speak.json", response_model=SpeakJSONResponse)
+async def speak_json(req: SpeakRequest, response: Response):
+    """
+    Legacy variant of /speak: returns base64-encoded audio wrapped in JSON.
+    """
+    key = cache_key(req)
+    # on a hit, encode straight from a pooled read buffer; it is released before anything is sent
+    with audio_cache.view(key, req.format) as cached:
+        hit = cached is not None
+        if hit:
+            payload_b64 = base64.b64encode(cached).decode("utf-8")
+    if not hit:
+        payload_b64 = base64.b64encode(await synthesize_and_store(req, key)).decode("utf-8")
+    response.headers["X-Cache"] = "HIT" if hit else "MISS"
+    return SpeakJSONResponse(audio_base64=payload_b64, format=req.format)
 
 class AssistantRequest(BaseModel):
     audio_file_b64: str   # base64-encoded audio bytes recorded by user
     voice_id: str
     provider: str | None = "openai"
 
+def split_sentences(text: str) -> list[str]:
+    if pysbd is not None:
+        chunks = pysbd.Segmenter(language="en", clean=False).segment(text)
+    else:
+        chunks = re.split(r"(?<=[.!?])\s+", text)
+    return [c.strip() for c in chunks if c.strip()]
+
+def synth_reply_chunk(text: str, reference_audio_path: str) -> asyncio.Future:
+    return asyncio.ensure_future(_run(openai_adapter.speak_using_reference, text=text,
+                                      reference_audio_path=reference_audio_path, out_format="wav"))
+
+async def stream_reply_audio(first_audio: bytes, ahead: asyncio.Future | None, chunks: list[str], reference_audio_path: str):
+    """
+    Yield one continuous WAV stream: `first_audio` (already synthesized), then the
+    audio for `chunks`, whose first entry is already running as `ahead`. Chunk N+1 is
+    synthesized in the background while chunk N is being sent.
+    """
+    try:
+        audio = first_audio
+        for i in range(len(chunks) + 1):
+            (nchannels, sampwidth, framerate), frames = read_wav(audio)
+            if i == 0:
+                yield wav_stream_header(nchannels, sampwidth, framerate)
+            yield apply_edge_fade(frames, nchannels, sampwidth, framerate)
+            if i < len(chunks):
+                audio = await ahead
+                ahead = synth_reply_chunk(chunks[i + 1], reference_audio_path) if i + 1 < len(chunks) else None
+    finally:
+        if ahead is not None:
+            ahead.cancel()  # client went away mid-stream
+
 @app.post("/assistant")
 async def assistant(req: AssistantRequest):
     """
     Full flow: user posts recorded audio (base64). We:
     1) transcribe user input
     2) send to LLM for response (OpenAI chat)
-    3) synthesize response with the specified voice
+    3) synthesize response with the specified voice, sentence by sentence
+    The body is a streamed WAV; transcription and reply text are returned URL-encoded
+    in the X-Transcription / X-Response-Text headers.
     """
     # decode incoming audio
     audio_bytes = base64.b64decode(req.audio_file_b64)
@@ -129,16 +272,32 @@ async def assistant(req: AssistantRequest):
     # 1) STT
     if not openai_adapter.is_configured:
         raise HTTPException(status_code=500, detail="OpenAI adapter not configured")
-    user_text = openai_adapter.transcribe_audio_bytes(audio_bytes, filename="user.wav")
+    user_text = await _run(openai_adapter.transcribe_audio_bytes, audio_bytes, filename="user.wav")
 
     # 2) Generate reply (simple chat)
-    ai_reply = openai_adapter.generate_chat_response(user_text)
+    ai_reply = await _run(openai_adapter.generate_chat_response, user_text) or ""
 
     # 3) TTS
     v = voice_store.get(req.voice_id)
     if not v:
         raise HTTPException(status_code=404, detail="voice not found")
-    audio_reply = openai_adapter.speak_using_reference(text=ai_reply, reference_audio_path=v["path"], out_format="wav")
+    chunks = split_sentences(ai_reply)
+    if not chunks:
+        raise HTTPException(status_code=502, detail="chat model returned an empty reply")
+
+    # Synthesize the first chunk before any bytes go out, so its failures still become
+    # HTTP errors instead of a 200 with an empty body; the second chunk starts meanwhile.
+    first = synth_reply_chunk(chunks[0], v["path"])
+    ahead = synth_reply_chunk(chunks[1], v["path"]) if len(chunks) > 1 else None
+    try:
+        first_audio = await first
+    except BaseException as e:
+        if ahead is not None:
+            ahead.cancel()
+        if isinstance(e, NotImplementedError):
+            raise HTTPException(status_code=501, detail=str(e))
+        raise
 
-    audio_b64 = base64.b64encode(audio_reply).decode("utf-8")
-    return {"transcription": user_text, "response_text": ai_reply, "audio_base64": audio_b64, "format": "wav"}
+    headers = {"X-Transcription": quote(user_text or ""), "X-Response-Text": quote(ai_reply)}
+    return StreamingResponse(stream_reply_audio(first_audio, ahead, chunks[1:], v["path"]),
+                             media_type="audio/wav", headers=headers)
@@ -0,0 +1,104 @@
+# backend/audio_cache.py
+import contextlib
+import hashlib
+import os
+import uuid
+from pathlib import Path
+from typing import Iterator
+
+from . import bufpool
+
+
+class AudioCache:
+    """
+    Content-addressed cache of synthesized audio.
+    Entries live under `cache_dir` as `{sha256}.{format}`; mtime doubles as the
+    last-used time so evict() can drop the least recently used files first.
+    """
+    def __init__(self, cache_dir: Path, max_bytes: int = 512 << 20):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+
+    @staticmethod
+    def key(text: str, voice_id: str, provider: str, fmt: str) -> str:
+        return hashlib.sha256("\0".join((text, voice_id, provider, fmt)).encode("utf-8")).hexdigest()
+
+    def _path(self, key: str, fmt: str) -> Path:
+        return self.cache_dir / f"{key}.{fmt}"
+
+    def _touch(self, path: Path) -> None:
+        try:
+            os.utime(path)  # mark as recently used
+        except OSError:
+            pass
+
+    def get(self, key: str, fmt: str) -> bytes | None:
+        path = self._path(key, fmt)
+        try:
+            data = path.read_bytes()
+        except FileNotFoundError:
+            return None
+        self._touch(path)
+        return data
+
+    @contextlib.contextmanager
+    def view(self, key: str, fmt: str) -> Iterator[memoryview | None]:
+        """
+        Read a cached entry into a pooled buffer and yield a view of it (None on a miss).
+        The buffer goes back to the pool when the block exits, so the view must not
+        outlive it -- in particular it must never be handed to a response/transport.
+        """
+        path = self._path(key, fmt)
+        try:
+            f = open(path, "rb")
+        except FileNotFoundError:
+            yield None
+            return
+        with f:
+            size = os.fstat(f.fileno()).st_size
+            buf = bufpool.acquire(size)
+            try:
+                n = f.readinto(memoryview(buf)[:size])
+            except BaseException:
+                bufpool.release(buf)
+                raise
+        self._touch(path)
+        try:
+            with memoryview(buf)[:n] as data:
+                yield data
+        finally:
+            bufpool.release(buf)
+
+    def put(self, key: str, fmt: str, data: bytes) -> None:
+        # write under a unique name then rename, so readers never see a partial file
+        tmp = self.cache_dir / f".{key}.{uuid.uuid4().hex}.tmp"
+        try:
+            tmp.write_bytes(data)
+            os.replace(tmp, self._path(key, fmt))
+        finally:
+            tmp.unlink(missing_ok=True)
+
+    def evict(self) -> int:
+        """
+        Delete least recently used entries until the cache fits in max_bytes.
+        Returns the number of files removed.
+        """
+        entries = []
+        total = 0
+        for p in self.cache_dir.iterdir():
+            try:
+                st = p.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((st.st_mtime, st.st_size, p))
+            total += st.st_size
+
+        removed = 0
+        for _, size, p in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            p.unlink(missing_ok=True)
+            total -= size
+            removed += 1
+        return removed
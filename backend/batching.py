@@ -0,0 +1,65 @@
+# backend/batching.py
+import asyncio
+from collections import defaultdict
+from typing import Callable, List, Optional
+
+BATCH_WINDOW_S = 0.02  # how long to wait for more requests after the first one arrives
+MAX_BATCH = 8
+
+
+class SpeakBatcher:
+    """
+    Coalesces concurrent /speak requests into micro-batches.
+    Requests arriving within BATCH_WINDOW_S of each other are grouped by reference
+    audio and handed to `synth_batch(texts, voice_ref) -> [bytes]` in one call,
+    which runs in a worker thread so the event loop stays free.
+    """
+    def __init__(self, synth_batch: Callable[[List[str], str], List[bytes]],
+                 window_s: float = BATCH_WINDOW_S, max_batch: int = MAX_BATCH):
+        self.synth_batch = synth_batch
+        self.window_s = window_s
+        self.max_batch = max_batch
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+
+    async def submit(self, text: str, voice_ref: str) -> bytes:
+        loop = asyncio.get_running_loop()
+        if self._worker is None or self._worker.done():
+            self._queue = asyncio.Queue()
+            self._worker = loop.create_task(self._run())
+        fut = loop.create_future()
+        await self._queue.put((text, str(voice_ref), fut))
+        return await fut
+
+    async def _collect(self) -> list:
+        loop = asyncio.get_running_loop()
+        batch = [await self._queue.get()]
+        deadline = loop.time() + self.window_s
+        while len(batch) < self.max_batch:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        while True:
+            batch = await self._collect()
+            groups = defaultdict(list)
+            for item in batch:
+                groups[item[1]].append(item)
+
+            for voice_ref, items in groups.items():
+                try:
+                    results = await asyncio.to_thread(self.synth_batch, [text for text, _, _ in items], voice_ref)
+                except Exception as e:
+                    for _, _, fut in items:
+                        if not fut.done():
+                            fut.set_exception(e)
+                    continue
+                for (_, _, fut), audio in zip(items, results):
+                    if not fut.done():
+                        fut.set_result(audio)
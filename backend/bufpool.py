@@ -0,0 +1,30 @@
+# backend/bufpool.py
+import threading
+
+MAX_POOLED = 8                # buffers kept around between requests
+MAX_POOLED_BYTES = 32 << 20   # don't hold on to outliers
+_ROUND = 64 << 10             # round allocations up so buffers fit more payloads
+
+_pool: list[bytearray] = []
+_lock = threading.Lock()
+
+
+def acquire(size: int) -> bytearray:
+    """
+    Return a bytearray of at least `size` bytes, reusing a released one when possible.
+    Callers should slice with memoryview(buf)[:size] and hand the buffer back via release().
+    """
+    with _lock:
+        # LIFO: the most recently released buffer is the most likely to still be cache-hot
+        for i in range(len(_pool) - 1, -1, -1):
+            if len(_pool[i]) >= size:
+                return _pool.pop(i)
+    return bytearray(-(-size // _ROUND) * _ROUND)
+
+
+def release(buf: bytearray) -> None:
+    if len(buf) > MAX_POOLED_BYTES:
+        return
+    with _lock:
+        if len(_pool) < MAX_POOLED:
+            _pool.append(buf)
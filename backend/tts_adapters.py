@@ -1,10 +1,13 @@
 # backend/tts_adapters.py
+import importlib.util
+import io
 import os
 from typing import Optional
 import base64
 
-# Optional dependency
+# Optional dependency (httpx ships with openai)
 try:
+    import httpx
     import openai
 except Exception:
     openai = None
@@ -17,40 +20,44 @@ class OpenAIAdapter:
     def __init__(self, api_key: Optional[str] = None):
         self.api_key = api_key
         self.is_configured = bool(api_key) and openai is not None
+        self.client = None
         if self.is_configured:
-            openai.api_key = api_key
+            # one pooled keep-alive client, so the STT -> chat -> TTS calls of /assistant
+            # reuse a TLS connection instead of handshaking each time
+            http_client = httpx.Client(
+                http2=importlib.util.find_spec("h2") is not None,
+                limits=httpx.Limits(max_connections=32, max_keepalive_connections=16),
+                timeout=60,
+            )
+            self.client = openai.OpenAI(api_key=api_key, http_client=http_client)
 
     def transcribe_audio_bytes(self, audio_bytes: bytes, filename="audio.wav") -> str:
         if not self.is_configured:
             raise RuntimeError("OpenAIAdapter not configured")
-        # Write temp file
-        import tempfile
-        tf = tempfile.NamedTemporaryFile(delete=False, suffix=Path(filename).suffix if '.' in filename else ".wav")
-        tf.write(audio_bytes)
-        tf.flush()
-        tf.close()
+        # the v1 client takes a (filename, fileobj) upload, so no temp file round-trip is needed
+        return self.transcribe_audio_stream(io.BytesIO(audio_bytes), filename=filename)
 
-        # Use OpenAI whisper transcriptions (this example uses openai.Audio.transcribe)
-        # NOTE: adapt to the exact client method if your openai package version differs.
-        with open(tf.name, "rb") as fh:
-            resp = openai.Audio.transcribe("gpt-4o-transcribe", fh)
-            # Many OpenAI python client implementations return a dict or object with 'text' field
-            text = resp["text"] if isinstance(resp, dict) and "text" in resp else getattr(resp, "text", None)
-        os.unlink(tf.name)
-        return text
+    def transcribe_audio_stream(self, fileobj, filename="audio.wav", content_type: Optional[str] = None) -> str:
+        """
+        Transcribe straight from a file-like object (e.g. `UploadFile.file`) without
+        reading it into memory or copying it to a temp file first.
+        """
+        if not self.is_configured:
+            raise RuntimeError("OpenAIAdapter not configured")
+        upload = (filename, fileobj, content_type) if content_type else (filename, fileobj)
+        resp = self.client.audio.transcriptions.create(model="gpt-4o-transcribe", file=upload)
+        return resp.text
 
     def generate_chat_response(self, user_text: str) -> str:
         if not self.is_configured:
             raise RuntimeError("OpenAIAdapter not configured")
         # Use chat completion
-        resp = openai.ChatCompletion.create(
+        resp = self.client.chat.completions.create(
             model=os.getenv("OPENAI_CHAT_MODEL", "gpt-4o-mini"),
             messages=[{"role": "user", "content": user_text}],
             max_tokens=400
         )
-        # adapt to client response structure
-        content = resp["choices"][0]["message"]["content"] if isinstance(resp, dict) else resp.choices[0].message.content
-        return content
+        return resp.choices[0].message.content
 
     def speak_using_reference(self, text: str, reference_audio_path: str, out_format: str = "wav") -> bytes:
         """
@@ -1 +1,95 @@
-ECHO is on.
+# backend/utils/audio.py
+import io
+import wave
+
+# Optional dependencies: in-process decode/resample (otherwise callers fall back to ffmpeg)
+try:
+    import soundfile
+    import soxr
+except Exception:
+    soundfile = None
+    soxr = None
+
+
+def pcm_to_wav_bytes(samples, sample_rate: int) -> bytes:
+    """
+    Encode float samples in [-1, 1] (list / numpy array / tensor) as 16-bit mono WAV bytes.
+    """
+    import numpy as np
+
+    pcm = (np.clip(np.asarray(samples, dtype=np.float32), -1.0, 1.0) * 32767).astype("<i2")
+    bio = io.BytesIO()
+    with wave.open(bio, "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(sample_rate)
+        w.writeframes(pcm.tobytes())
+    return bio.getvalue()
+
+
+def needs_normalization(path, sample_rate: int = 22050) -> bool:
+    """
+    Return False when `path` is already a 16-bit mono WAV at `sample_rate` and can be
+    handed to TTS as-is. Anything `wave` can't parse needs conversion.
+    """
+    try:
+        with wave.open(str(path), "rb") as w:
+            return not (w.getnchannels() == 1 and w.getframerate() == sample_rate and w.getsampwidth() == 2)
+    except (wave.Error, EOFError, OSError):
+        return True
+
+
+def read_wav(wav_bytes: bytes):
+    """
+    Split WAV bytes into ((nchannels, sampwidth, framerate), raw PCM frames).
+    """
+    with wave.open(io.BytesIO(wav_bytes), "rb") as w:
+        params = (w.getnchannels(), w.getsampwidth(), w.getframerate())
+        return params, w.readframes(w.getnframes())
+
+
+def wav_stream_header(nchannels: int, sampwidth: int, framerate: int) -> bytes:
+    """
+    RIFF/WAVE header for a stream of unknown length (size fields set to 0xFFFFFFFF,
+    which browsers and ffmpeg treat as "read until EOF").
+    """
+    import struct
+
+    block_align = nchannels * sampwidth
+    return (
+        b"RIFF" + struct.pack("<I", 0xFFFFFFFF) + b"WAVE"
+        + b"fmt " + struct.pack("<IHHIIHH", 16, 1, nchannels, framerate,
+                                framerate * block_align, block_align, sampwidth * 8)
+        + b"data" + struct.pack("<I", 0xFFFFFFFF)
+    )
+
+
+def apply_edge_fade(frames: bytes, nchannels: int, sampwidth: int, framerate: int, fade_ms: float = 2.0) -> bytes:
+    """
+    Linear fade-in/out over the first/last `fade_ms` of 16-bit PCM so that
+    concatenated chunks don't click at the seams. Other sample widths pass through.
+    """
+    if sampwidth != 2:
+        return frames
+    import numpy as np
+
+    pcm = np.frombuffer(frames, dtype="<i2").reshape(-1, nchannels).astype(np.float32)
+    n = min(int(framerate * fade_ms / 1000), len(pcm) // 2)
+    if n > 0:
+        ramp = np.linspace(0.0, 1.0, n, dtype=np.float32)[:, None]
+        pcm[:n] *= ramp
+        pcm[-n:] *= ramp[::-1]
+    return pcm.astype("<i2").tobytes()
+
+
+def resample_mono(src, dst, target_sr: int = 22050, format: str = "WAV") -> None:
+    """
+    Decode `src` with libsndfile, downmix to mono, resample with libsoxr and
+    write 16-bit PCM to `dst` in `format` (WAV, FLAC, ...). Requires `soundfile` and `soxr`.
+    """
+    data, sr = soundfile.read(str(src), dtype="float32", always_2d=False)
+    if data.ndim == 2:
+        data = data.mean(axis=1)
+    if sr != target_sr:
+        data = soxr.resample(data, sr, target_sr, quality="HQ")
+    soundfile.write(str(dst), data, target_sr, subtype="PCM_16", format=format)
@@ -0,0 +1,56 @@
+# backend/utils/fileio.py
+import hashlib
+import io
+import os
+import shutil
+from pathlib import Path
+
+COPY_BUFSIZE = 1 << 20
+
+
+def _real_fileno(f) -> int | None:
+    try:
+        return f.fileno()
+    except (AttributeError, OSError, io.UnsupportedOperation):
+        return None
+
+
+def copy_fileobj(src, dst) -> None:
+    """
+    Copy the rest of `src` into `dst`. Uses os.sendfile (kernel zero-copy) when
+    both ends are real files, otherwise shutil.copyfileobj with a 1 MiB buffer.
+    """
+    infd, outfd = _real_fileno(src), _real_fileno(dst)
+    if infd is not None and outfd is not None and hasattr(os, "sendfile"):
+        dst.flush()
+        offset = start = src.tell()
+        size = os.fstat(infd).st_size
+        try:
+            while offset < size:
+                sent = os.sendfile(outfd, infd, offset, size - offset)
+                if sent == 0:
+                    break
+                offset += sent
+            src.seek(offset)
+            return
+        except OSError:
+            if offset != start:
+                raise
+            # sendfile not supported for this pair of files; fall through
+
+    shutil.copyfileobj(src, dst, COPY_BUFSIZE)
+
+
+def fast_copy(src: Path, dst: Path) -> None:
+    with open(src, "rb") as s, open(dst, "wb") as d:
+        copy_fileobj(s, d)
+
+
+def sha256_file(path: Path) -> str:
+    with open(path, "rb") as f:
+        if hasattr(hashlib, "file_digest"):  # 3.11+: readinto on a reused buffer
+            return hashlib.file_digest(f, "sha256").hexdigest()
+        h = hashlib.sha256()
+        for chunk in iter(lambda: f.read(COPY_BUFSIZE), b""):
+            h.update(chunk)
+        return h.hexdigest()
@@ -1,47 +1,152 @@
 # backend/voice_store.py
+import hashlib
 import json
+import os
+import threading
 import uuid
 from pathlib import Path
-from typing import Dict
+from typing import BinaryIO, Dict
+from .utils import audio as audio_utils
+from .utils.fileio import COPY_BUFSIZE, sha256_file
+
+STORED_SAMPLE_RATE = 16000  # plenty for a cloning reference; normalized again per model
+
+# Optional dependency: faster JSON parsing
+try:
+    import orjson
+except Exception:
+    orjson = None
 
 class VoiceStore:
     """
     Simple filesystem-backed voice store.
-    Each voice profile = a small JSON file + the uploaded reference audio.
+    Each voice profile = a small JSON file + the reference audio, stored as 16kHz mono
+    FLAC when soundfile/soxr are available (the raw upload is kept as `*.orig.*` only
+    with keep_original=True). Uploads that are already TTS-ready WAVs are kept as-is. Re-uploads of an identical sample share the stored file,
+    via an upload-sha256 -> stored file index in `sha_index.json`.
     """
-    def __init__(self, storage_dir: Path):
+    def __init__(self, storage_dir: Path, keep_original: bool = False):
         self.storage_dir = Path(storage_dir)
+        self.keep_original = keep_original
         self.profiles_dir = self.storage_dir / "profiles"
         self.profiles_dir.mkdir(parents=True, exist_ok=True)
+        # voice_id -> (meta file mtime, parsed meta); refreshed when the file changes
+        self._cache: Dict[str, tuple[float, Dict]] = {}
+        # kept next to (not inside) profiles/ so it is never mistaken for a voice's meta JSON
+        self._sha_index_path = self.storage_dir / "sha_index.json"
+        self._sha_index: Dict[str, Dict] = {}
+        if self._sha_index_path.exists():
+            with open(self._sha_index_path, "r", encoding="utf-8") as f:
+                self._sha_index = json.load(f)
+        self._sha_lock = threading.Lock()
 
-    def create_voice(self, audio_bytes: bytes, original_filename: str = "sample.wav", name: str | None = None) -> str:
+    def create_voice(self, fileobj: BinaryIO, original_filename: str = "sample.wav", name: str | None = None) -> str:
+        """
+        Store a reference sample read from `fileobj` (e.g. `UploadFile.file`).
+        The stream is hashed while it is copied to disk in 1 MiB chunks, never held in
+        memory whole; if the same bytes were uploaded before, the new voice reuses that file.
+        """
         voice_id = uuid.uuid4().hex[:12]
-        filename = f"{voice_id}_{Path(original_filename).name}"
-        path = self.profiles_dir / filename
-        with open(path, "wb") as f:
-            f.write(audio_bytes)
+        tmp = self.profiles_dir / f".{voice_id}.upload"
+        h = hashlib.sha256()
+        try:
+            with open(tmp, "wb") as f:
+                for chunk in iter(lambda: fileobj.read(COPY_BUFSIZE), b""):
+                    h.update(chunk)
+                    f.write(chunk)
+            upload_sha = h.hexdigest()
+
+            with self._sha_lock:
+                stored = self._sha_index.get(upload_sha)
+            if stored is not None and Path(stored["path"]).exists():
+                path = Path(stored["path"])
+                file_sha = stored["sha256"]
+            else:
+                path = self.profiles_dir / f"{voice_id}_{Path(original_filename).name}"
+                os.replace(tmp, path)
+                path = self._compact(path)
+                file_sha = sha256_file(path)
+                with self._sha_lock:
+                    self._sha_index[upload_sha] = {"path": str(path), "sha256": file_sha}
+                    self._save_sha_index()
+        finally:
+            tmp.unlink(missing_ok=True)
 
         meta = {
             "id": voice_id,
             "name": name or f"voice-{voice_id}",
-            "filename": filename,
+            # per-voice download name; `path` may be shared with an identical earlier upload
+            "filename": f"{voice_id}_{Path(original_filename).stem}{path.suffix}",
             "path": str(path),
+            "sha256": file_sha,  # strong ETag for downloads
+            # probed once here so the local TTS path never has to re-open the file
+            "needs_normalization": audio_utils.needs_normalization(path),
         }
         meta_path = self.profiles_dir / f"{voice_id}.json"
         with open(meta_path, "w", encoding="utf-8") as f:
             json.dump(meta, f, indent=2)
         return voice_id
 
-    def get(self, voice_id: str) -> Dict | None:
-        meta_path = self.profiles_dir / f"{voice_id}.json"
-        if not meta_path.exists():
-            return None
+    def _save_sha_index(self) -> None:
+        tmp = self._sha_index_path.with_name(f".{self._sha_index_path.name}.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self._sha_index, f)
+        os.replace(tmp, self._sha_index_path)
+
+    def _compact(self, path: Path) -> Path:
+        """
+        Re-encode an upload as 16kHz mono FLAC and return the new path. Returns `path`
+        unchanged when the optional audio deps are missing or libsndfile can't decode it,
+        and for uploads the local TTS can use directly (16-bit mono 22050Hz WAV): those stay
+        uncompressed so they keep skipping the per-voice normalization step.
+        """
+        if audio_utils.soundfile is None or not audio_utils.needs_normalization(path):
+            return path
+        flac = path.with_suffix(".flac")
+        if flac == path:
+            flac = path.with_name(f"{path.stem}.16k.flac")
+        try:
+            audio_utils.resample_mono(path, flac, STORED_SAMPLE_RATE, format="FLAC")
+        except RuntimeError:
+            flac.unlink(missing_ok=True)
+            return path
+        if self.keep_original:
+            path.rename(path.with_name(f"{path.stem}.orig{path.suffix}"))
+        else:
+            path.unlink()
+        return flac
+
+    @staticmethod
+    def _load(meta_path: Path) -> Dict:
+        if orjson is not None:
+            return orjson.loads(meta_path.read_bytes())
         with open(meta_path, "r", encoding="utf-8") as f:
             return json.load(f)
 
+    def _get_cached(self, voice_id: str, meta_path: Path) -> Dict | None:
+        try:
+            mtime = meta_path.stat().st_mtime
+        except FileNotFoundError:
+            self._cache.pop(voice_id, None)
+            return None
+        cached = self._cache.get(voice_id)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+        meta = self._load(meta_path)
+        self._cache[voice_id] = (mtime, meta)
+        return meta
+
+    def get(self, voice_id: str) -> Dict | None:
+        return self._get_cached(voice_id, self.profiles_dir / f"{voice_id}.json")
+
     def list(self):
         res = []
+        seen = set()
         for p in self.profiles_dir.glob("*.json"):
-            with open(p, "r", encoding="utf-8") as f:
-                res.append(json.load(f))
+            meta = self._get_cached(p.stem, p)
+            if meta is not None:
+                seen.add(p.stem)
+                res.append(meta)
+        for voice_id in self._cache.keys() - seen:
+            del self._cache[voice_id]
         return res
@@ -16,21 +16,28 @@ document.getElementById("recordBtn").onclick = async () => {
   }
 };
 
+function blobToBase64(blob) {
+  return new Promise((resolve, reject) => {
+    const reader = new FileReader();
+    reader.onload = () => resolve(reader.result.split(",")[1]);
+    reader.onerror = reject;
+    reader.readAsDataURL(blob);
+  });
+}
+
 async function sendAudio() {
   const blob = new Blob(chunks, { type: "audio/wav" });
-  const form = new FormData();
-  form.append("audio", blob, "audio.wav");
 
-  const res = await fetch("http://localhost:8000/assistant?voice_id=your-id-here", {
+  const res = await fetch("http://localhost:8000/assistant", {
     method: "POST",
-    body: form
+    headers: { "Content-Type": "application/json" },
+    body: JSON.stringify({ audio_file_b64: await blobToBase64(blob), voice_id: "your-id-here" })
   });
 
-  const data = await res.json();
-  const audioBytes = new Uint8Array(
-    data.audio.match(/.{1,2}/g).map(byte => parseInt(byte, 16))
-  );
+  // the reply audio is the raw response body; the texts come back in headers
+  console.log("You said:", decodeURIComponent(res.headers.get("X-Transcription") || ""));
+  console.log("Assistant:", decodeURIComponent(res.headers.get("X-Response-Text") || ""));
 
-  const audioBlob = new Blob([audioBytes], { type: "audio/wav" });
+  const audioBlob = await res.blob();
   document.getElementById("responseAudio").src = URL.createObjectURL(audioBlob);
 }